@@ -9,7 +9,7 @@ BOLD='\033[1m'
 echo -e "${BOLD}🎵 Shazam Tool Setup & Runner${NC}\n"
 
 # Ensure directories exist
-mkdir -p downloads tmp recognised-lists logs
+mkdir -p downloads recognised-lists logs
 
 # Function to check if command exists
 command_exists() {
@@ -86,7 +86,7 @@ show_help() {
   echo ""
   echo "Commands:"
   echo "  setup       - Install dependencies and set up the environment"
-  echo "  download    - Download and analyze audio from URL"
+  echo "  download    - Download and analyze audio from one or more URLs"
   echo "               Example: ./run_shazam.sh download https://soundcloud.com/user/track"
   echo "  scan        - Process all downloaded files"
   echo "  recognize   - Process a specific audio file"
@@ -106,10 +106,10 @@ case "$1" in
   "download")
     if [ -z "$2" ]; then
       echo "Error: URL required"
-      echo "Usage: ./run_shazam.sh download <url>"
+      echo "Usage: ./run_shazam.sh download <url> [<url>...]"
       exit 1
     fi
-    run_shazam download "$2"
+    run_shazam download "${@:2}"
     ;;
   "scan")
     run_shazam scan
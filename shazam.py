@@ -1,14 +1,33 @@
+import io
 import os
 import sys
+import wave
+import random
+import time
+import hashlib
+import sqlite3
 import asyncio
-from datetime import datetime
+import threading
+from datetime import datetime, timezone
 import subprocess
+import tempfile
 import logging
+import logging.handlers
+import queue
+import atexit
 import argparse
-from concurrent.futures import ThreadPoolExecutor
-
-from pydub import AudioSegment
+import urllib.parse
+from email.utils import parsedate_to_datetime
+import math
+from array import array
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import AsyncIterable, AsyncIterator, Iterable, Iterator, Optional, Union
+
+import aiohttp
 from shazamio import Shazam
+from shazamio.exceptions import BadMethod, FailedDecodeJson
+from shazamio.interfaces.client import HTTPClientInterface
+from shazamio.utils import validate_json
 from yt_dlp import YoutubeDL
 
 # Duration of each segment in milliseconds (1 minute)
@@ -17,18 +36,92 @@ SEGMENT_LENGTH = 60 * 1000
 # Directory for downloaded files
 DOWNLOADS_DIR = 'downloads'
 
+# Shazam fingerprints mono audio at 16 kHz, so segments are decoded to that
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2  # bytes per sample (signed 16-bit PCM)
+SEGMENT_BYTES = SAMPLE_WIDTH * SAMPLE_RATE * SEGMENT_LENGTH // 1000
+WAV_HEADER_SIZE = 44  # header written by the wave module for plain PCM
+
+# Maximum number of segments sent to Shazam at the same time
+RECOGNITION_CONCURRENCY = 8
+
+# Seconds a resolved Shazam address is reused before looking it up again
+DNS_CACHE_TTL = 300
+
+# Seconds an idle Shazam connection is kept open; above the gaps the rate
+# limit and backoff leave between requests, so connections are reused
+KEEPALIVE_TIMEOUT = 30
+
+# Shazam throttles clients above roughly 20 recognitions per minute
+SHAZAM_REQUESTS_PER_MINUTE = 20
+SHAZAM_BURST = 5
+
+# Longest Retry-After (in seconds) honoured before falling back to backoff
+MAX_RETRY_AFTER = 60
+
+# Results reported for segments without a recognized track
+NOT_FOUND = "Not found"
+RATE_LIMITED = "Rate limited"
+REQUEST_FAILED = "Request failed"
+UNRECOGNIZED = frozenset({NOT_FOUND, RATE_LIMITED, REQUEST_FAILED})
+
+# Recognized tracks are cached by segment audio hash for CACHE_TTL seconds
+# CACHE_DIR can be changed with --cache-dir
+CACHE_DIR = 'cache'
+CACHE_DB_NAME = 'recognitions.sqlite3'
+CACHE_TTL = 30 * 24 * 60 * 60
+
+# Whole-file results are keyed by a sparse content hash: the file size plus
+# its first and last FILE_HASH_SPAN bytes. Bump FILE_CACHE_VERSION whenever
+# recognition changes in a way that invalidates stored results.
+FILE_HASH_SPAN = 1024 * 1024
+FILE_CACHE_VERSION = 1
+
+# Adjacent segments whose loudness and zero-crossing profiles differ by less
+# than SIMILARITY_THRESHOLD reuse the earlier segment's recognition
+SIMILARITY_THRESHOLD = 0.01
+SIGNATURE_BLOCKS = 64
+SIGNATURE_STRIDE = 8  # only every 8th sample is inspected (2 kHz)
+
+# Segments where no signature block is louder than this RMS (16-bit scale)
+# are treated as silence and reported as NOT_FOUND without asking Shazam
+SILENCE_THRESHOLD = 200
+
+# Maximum number of files decoded ahead of recognition in worker threads
+# (the decoding itself is done by one ffmpeg process per file)
+SEGMENT_WORKERS = 4
+
+# Default number of files recognized at the same time during a scan (--workers)
+PARALLEL_FILES = 2
+
+# Number of fragments yt-dlp fetches in parallel for DASH/HLS streams
+CONCURRENT_FRAGMENTS = 4
+
+# Maximum number of URLs downloaded at the same time
+PARALLEL_DOWNLOADS = 4
+
 # Logger setup 
 logger = logging.getLogger('shazam_tool')
 
+# Background thread writing log records to the console and logs/app.log
+log_listener: Optional[logging.handlers.QueueListener] = None
+
+# Directories already created during this run
+_ENSURED: set[str] = set()
+
 def setup_logging(debug_mode=False):
     """
     Configure logging based on debug mode.
     When debug mode is enabled, detailed logs are written to both console and file.
+    Records are only queued by the logging call; a QueueListener thread does
+    the writing, so logging never blocks the event loop on disk or terminal I/O.
     """
+    global log_listener
     log_level = logging.DEBUG if debug_mode else logging.INFO
     log_format = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
     
     # Reset handlers if they exist
+    stop_logging()
     logger.handlers = []
     logger.setLevel(log_level)
     
@@ -36,10 +129,9 @@ def setup_logging(debug_mode=False):
     ensure_directory_exists('logs')
     
     # File handler - always logs at DEBUG level to app.log
-    file_handler = logging.FileHandler('logs/app.log')
+    file_handler = logging.FileHandler('logs/app.log', delay=True)
     file_handler.setLevel(logging.DEBUG)
     file_handler.setFormatter(logging.Formatter(log_format))
-    logger.addHandler(file_handler)
     
     # Console handler - level depends on debug_mode
     console_handler = logging.StreamHandler()
@@ -52,274 +144,1019 @@ def setup_logging(debug_mode=False):
         console_format = log_format
         
     console_handler.setFormatter(logging.Formatter(console_format))
-    logger.addHandler(console_handler)
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    log_listener = logging.handlers.QueueListener(log_queue, file_handler, console_handler,
+                                                  respect_handler_level=True)
+    log_listener.start()
     
     if debug_mode:
         logger.debug("Debug mode enabled - detailed logging activated")
 
 
+def stop_logging() -> None:
+    """
+    Stops the log listener, writing out whatever is still queued.
+    """
+    global log_listener
+    if log_listener is not None:
+        log_listener.stop()
+        log_listener = None
+
+
+atexit.register(stop_logging)
+
+
 def ensure_directory_exists(dir_path: str) -> None:
     """
     Checks if directory exists, creates it if it doesn't.
+    Directories are only checked once per run to skip repeated mkdir calls.
     """
+    if dir_path in _ENSURED:
+        return
     os.makedirs(dir_path, exist_ok=True)
+    _ENSURED.add(dir_path)
     logger.debug(f"Ensured directory exists: {dir_path}")
 
 
-def remove_files(directory: str) -> None:
+def write_chunks(chunks: list[str], filename: str) -> None:
     """
-    Removes all files in specified directory. If directory doesn't exist,
-    it will be created.
+    Replaces the contents of filename with the given text chunks, issuing a
+    single vectored write where the platform supports it. The chunks are
+    written to a temporary file that is then renamed over filename, so an
+    interrupted run never leaves a half-written results file behind.
     """
-    ensure_directory_exists(directory)
-    file_count = 0
-    for file_name in os.listdir(directory):
-        file_path = os.path.join(directory, file_name)
+    data = [chunk.encode("utf-8") for chunk in chunks]
+    staging = f"{filename}.tmp"
+    try:
+        fd = os.open(staging, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
         try:
-            os.remove(file_path)
-            file_count += 1
-        except OSError as e:
-            logger.error(f"Error deleting file {file_path}: {e}")
-    logger.debug(f"Removed {file_count} files from {directory}")
+            # 1024 is IOV_MAX on Linux and macOS; anything written short is finished below
+            written = os.writev(fd, data) if hasattr(os, "writev") and len(data) <= 1024 else 0
+            if written < sum(map(len, data)):
+                remaining = b"".join(data)[written:]
+                while remaining:
+                    remaining = remaining[os.write(fd, remaining):]
+        finally:
+            os.close(fd)
+        os.replace(staging, filename)
+    except OSError as e:
+        logger.error(f"Error writing to file {filename}: {e}")
+        try:
+            os.unlink(staging)
+        except OSError:
+            pass
 
 
-def write_to_file(data: str, filename: str) -> None:
+def audio_download_options(output_path: str) -> dict:
     """
-    Appends text string to specified file if data != 'Not found'.
+    Returns yt-dlp options downloading the best audio-only stream and
+    converting it to mp3 in output_path. yt-dlp's own output is only shown
+    in debug mode, since concurrent downloads would interleave progress bars.
     """
-    if data != "Not found":
-        try:
-            with open(filename, "a", encoding="utf-8") as f:
-                f.write(f"{data}\n")
-        except OSError as e:
-            print(f"Error writing to file {filename}: {e}")
-
-
-def download_soundcloud(url: str, output_path: str = DOWNLOADS_DIR) -> None:
+    quiet = not logger.isEnabledFor(logging.DEBUG)
+    return {
+        'format': 'bestaudio/best',
+        'postprocessors': [{
+            'key': 'FFmpegExtractAudio',
+            'preferredcodec': 'mp3',
+            'preferredquality': '192',
+        }],
+        'outtmpl': f'{output_path}/%(title)s.%(ext)s',
+        'concurrent_fragment_downloads': CONCURRENT_FRAGMENTS,
+        'quiet': quiet,
+        'noprogress': quiet,
+    }
+
+
+def downloaded_paths(info: dict) -> list[str]:
     """
-    Download audio from a SoundCloud URL using yt-dlp.
+    Returns the files yt-dlp wrote for an extract_info result, after post-processing
+    (so the mp3, not the original stream). Playlists list every entry's files.
     """
-    ensure_directory_exists(output_path)
-    logger.debug(f"Attempting to download from SoundCloud: {url}")
-    try:
-        ydl_opts = {
-            'format': 'bestaudio/best',
-            'postprocessors': [{
-                'key': 'FFmpegExtractAudio',
-                'preferredcodec': 'mp3',
-                'preferredquality': '192',
-            }],
-            'outtmpl': f'{output_path}/%(title)s.%(ext)s',
-        }
-        
-        with YoutubeDL(ydl_opts) as ydl:
-            ydl.download([url])
-        logger.info("✅ Successfully downloaded from SoundCloud!")
-    except Exception as e:
-        logger.error(f"❌ Failed to download from SoundCloud {url}: {e}")
+    entries = info.get('entries')
+    if entries is not None:
+        return [path for entry in entries if entry for path in downloaded_paths(entry)]
+    return [d['filepath'] for d in info.get('requested_downloads') or () if d.get('filepath')]
 
 
-def download_youtube(url: str, output_path: str = DOWNLOADS_DIR) -> None:
+def download_audio(url: str, source: str, output_path: str = DOWNLOADS_DIR) -> list[str]:
     """
-    Download the audio track from a YouTube video and convert to mp3 using yt-dlp.
+    Download the audio track behind a SoundCloud or YouTube URL and convert
+    it to mp3 using yt-dlp. Each call uses its own YoutubeDL instance, so
+    downloads may run in parallel threads.
+    Returns the paths of the mp3 files written, empty if the download failed.
     """
     ensure_directory_exists(output_path)
-    logger.debug(f"Attempting to download from YouTube: {url}")
+    logger.debug(f"Attempting to download from {source}: {url}")
     try:
-        ydl_opts = {
-            'format': 'bestaudio/best',
-            'postprocessors': [{
-                'key': 'FFmpegExtractAudio',
-                'preferredcodec': 'mp3',
-                'preferredquality': '192',
-            }],
-            'outtmpl': f'{output_path}/%(title)s.%(ext)s',
-        }
-        
-        with YoutubeDL(ydl_opts) as ydl:
+        with YoutubeDL(audio_download_options(output_path)) as ydl:
             info = ydl.extract_info(url, download=True)
             title = info.get('title', 'Unknown Title')
             logger.info(f"✅ Successfully downloaded: {title}!")
+            return downloaded_paths(info)
     except Exception as e:
-        logger.error(f"❌ Error downloading from YouTube {url}: {e}")
+        logger.error(f"❌ Failed to download from {source} {url}: {e}")
+        return []
+
 
+# Supported hosts, matched on the URL's hostname and any of its subdomains
+DOWNLOADERS = {
+    'soundcloud.com': ("🎵 SoundCloud URL detected", "SoundCloud"),
+    'youtube.com': ("🎥 YouTube URL detected", "YouTube"),
+    'youtu.be': ("🎥 YouTube URL detected", "YouTube"),
+}
 
-def download_from_url(url: str) -> None:
+
+def download_from_url(url: str) -> list[str]:
     """
     Determines if URL is YouTube or SoundCloud and calls appropriate download function.
+    Returns the paths of the downloaded mp3 files.
     """
     logger.info("🚀 Starting download...")
-    lower_url = url.lower()
     logger.debug(f"Processing URL: {url}")
-    if 'soundcloud.com' in lower_url:
-        logger.info("🎵 SoundCloud URL detected")
-        download_soundcloud(url)
-    elif 'youtube.com' in lower_url or 'youtu.be' in lower_url:
-        logger.info("🎥 YouTube URL detected")
-        download_youtube(url)
-    else:
+    url = url.strip()
+    # urlparse only finds the host after "//", which pasted links may lack
+    host = urllib.parse.urlparse(url if '//' in url else f'//{url}').hostname or ""
+    # Strip subdomains one label at a time (www., m., music., on.)
+    while host and host not in DOWNLOADERS:
+        host = host.partition('.')[2]
+    if not host:
         logger.error("❌ Unsupported URL format. Please provide a YouTube or SoundCloud link.")
+        return []
+    message, source = DOWNLOADERS[host]
+    logger.info(message)
+    return download_audio(url, source)
 
 
-def segment_audio(audio_file: str, output_directory: str = "tmp", num_threads: int = 4) -> None:
+async def download_from_urls(urls: list[str], downloaded: Optional[asyncio.Queue] = None) -> None:
     """
-    Segments MP3 file into chunks of SEGMENT_LENGTH duration (in milliseconds)
-    using parallel processing.
+    Downloads several URLs concurrently, running each download_from_url call
+    in its own worker thread since the work is network-bound. At most
+    PARALLEL_DOWNLOADS run at once, as each one also ends in an ffmpeg
+    conversion to mp3.
+    If downloaded is given, each file is put on it as soon as its download finishes.
+    """
+    logger.debug(f"Downloading {len(urls)} URL(s), {PARALLEL_DOWNLOADS} at a time")
+    semaphore = asyncio.Semaphore(PARALLEL_DOWNLOADS)
+
+    async def download(url: str) -> None:
+        async with semaphore:
+            paths = await asyncio.to_thread(download_from_url, url)
+        if downloaded is not None:
+            for path in paths:
+                downloaded.put_nowait(path)
+
+    tasks = [download(url) for url in urls]
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    for url, result in zip(urls, results):
+        if isinstance(result, Exception):
+            logger.error(f"❌ Failed to download {url}: {result}")
+
+
+def ffmpeg_decode_command(audio_file: str) -> list[str]:
     """
-    ensure_directory_exists(output_directory)
-    logger.debug(f"Segmenting audio file: {audio_file} with {num_threads} threads")
+    Returns the ffmpeg command writing audio_file to stdout as mono 16-bit PCM at SAMPLE_RATE.
+    """
+    return [
+        "ffmpeg", "-v", "error", "-i", audio_file, "-map", "0:a:0",
+        "-f", "s16le", "-ac", "1", "-ar", str(SAMPLE_RATE), "pipe:1",
+    ]
+
+
+def pcm_to_wav(pcm: bytes) -> bytes:
+    """
+    Wraps mono PCM at SAMPLE_RATE in a WAV container Shazam can read.
+    """
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(SAMPLE_WIDTH)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes(pcm)
+    return buffer.getvalue()
+
+
+def iter_segments(audio_file: str) -> Iterator[bytes]:
+    """
+    Yields WAV chunks of SEGMENT_LENGTH duration (in milliseconds), reading
+    ffmpeg's PCM output one segment at a time so the whole decoded file is
+    never held in a single buffer.
+    Raises CalledProcessError if ffmpeg fails.
+    """
+    # ffmpeg's errors go to a file: a pipe nobody reads while stdout is
+    # drained fills up on a damaged file and blocks ffmpeg for good
+    with tempfile.TemporaryFile() as stderr:
+        with subprocess.Popen(ffmpeg_decode_command(audio_file),
+                              stdout=subprocess.PIPE, stderr=stderr) as process:
+            # A buffered read blocks until a full segment or the end of the stream
+            while pcm := process.stdout.read(SEGMENT_BYTES):
+                yield pcm_to_wav(pcm)
+        if process.returncode:
+            stderr.seek(0)
+            raise subprocess.CalledProcessError(process.returncode, process.args,
+                                                stderr=stderr.read().decode(errors="replace").strip())
+
+
+def segment_audio(audio_file: str, errors: Optional[list[str]] = None) -> list[bytes]:
+    """
+    Decodes audio file once and splits it into WAV chunks of SEGMENT_LENGTH
+    duration (in milliseconds), kept in memory for recognition.
+    Returns the segments in playback order; segments decoded before an error
+    are kept, and the error is appended to errors if given.
+    """
+    logger.debug(f"Segmenting audio file: {audio_file}")
+    segments = []
+    error = None
     try:
-        audio = AudioSegment.from_file(audio_file, format="mp3")
-        segments = [audio[i:i + SEGMENT_LENGTH] for i in range(0, len(audio), SEGMENT_LENGTH)]
-        total_segments = len(segments)
-        logger.debug(f"Created {total_segments} segments of {SEGMENT_LENGTH}ms each")
+        for segment in iter_segments(audio_file):
+            segments.append(segment)
+    except subprocess.CalledProcessError as e:
+        error = e.stderr or str(e)
+    except OSError as e:
+        error = str(e)
+    if error is not None:
+        logger.error(f"Failed to segment audio file {audio_file}: {error}")
+        if errors is not None:
+            errors.append(error)
 
-        with ThreadPoolExecutor(max_workers=num_threads) as executor:
-            futures = []
-            for idx, seg in enumerate(segments, start=1):
-                segment_file_path = os.path.join(output_directory, f"{idx}.mp3")
-                futures.append(
-                    executor.submit(seg.export, segment_file_path, format="mp3")
-                )
+    logger.debug(f"Created {len(segments)} segments of {SEGMENT_LENGTH}ms each")
+    return segments
 
-            for future in futures:
-                future.result()
 
-    except Exception as e:
-        logger.error(f"Failed to segment audio file {audio_file}: {e}")
+def segment_signature(segment: bytes) -> list[tuple[float, float]]:
+    """
+    Returns a cheap (RMS, zero-crossing rate) profile over SIGNATURE_BLOCKS
+    blocks of a WAV segment, used to spot adjacent segments carrying the
+    same audio without asking Shazam.
+    """
+    samples = array("h")
+    samples.frombytes(segment[WAV_HEADER_SIZE:])
+    if sys.byteorder == "big":
+        samples.byteswap()
+    samples = samples[::SIGNATURE_STRIDE]
+
+    block_size = max(1, len(samples) // SIGNATURE_BLOCKS)
+    signature = []
+    for start in range(0, block_size * SIGNATURE_BLOCKS, block_size):
+        block = samples[start:start + block_size]
+        if not block:
+            break
+        rms = math.sqrt(sum(x * x for x in block) / len(block))
+        crossings = sum((a < 0) != (b < 0) for a, b in zip(block, block[1:]))
+        signature.append((rms, crossings / len(block)))
+    return signature
+
+
+def is_silent(signature: list[tuple[float, float]]) -> bool:
+    """
+    True if every block of a segment signature is below SILENCE_THRESHOLD,
+    so a short burst of music is enough to keep the segment.
+    """
+    return all(rms < SILENCE_THRESHOLD for rms, _ in signature)
+
+
+def signature_distance(a: list[tuple[float, float]], b: list[tuple[float, float]]) -> float:
+    """
+    Returns the mean per-block difference between two segment signatures,
+    with loudness compared relatively. Signatures of different length never match.
+    """
+    if not a or len(a) != len(b):
+        return math.inf
+    total = 0.0
+    for (rms_a, zcr_a), (rms_b, zcr_b) in zip(a, b):
+        total += abs(rms_a - rms_b) / max(rms_a, rms_b, 1.0) + abs(zcr_a - zcr_b)
+    return total / len(a)
+
+
+async def stream_segments(audio_file: str, errors: Optional[list[str]] = None) -> AsyncIterator[bytes]:
+    """
+    Yields WAV chunks of SEGMENT_LENGTH duration (in milliseconds) while ffmpeg
+    is still decoding audio_file, so recognition starts with the first segment.
+    If ffmpeg fails, the error is appended to errors if given.
+    """
+    logger.debug(f"Streaming segments from: {audio_file}")
+    # ffmpeg's errors go to a file, as in iter_segments: an unread stderr pipe
+    # would fill up and stall ffmpeg while we wait on stdout
+    with tempfile.TemporaryFile() as stderr:
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *ffmpeg_decode_command(audio_file),
+                stdout=asyncio.subprocess.PIPE, stderr=stderr,
+            )
+        except OSError as e:
+            logger.error(f"Failed to segment audio file {audio_file}: {e}")
+            if errors is not None:
+                errors.append(str(e))
+            return
+        count = 0
+        exhausted = False
+        try:
+            while not exhausted:
+                try:
+                    pcm = await process.stdout.readexactly(SEGMENT_BYTES)
+                except asyncio.IncompleteReadError as e:
+                    # The last segment is shorter than SEGMENT_LENGTH
+                    pcm = e.partial
+                    exhausted = True
+                if pcm:
+                    count += 1
+                    yield pcm_to_wav(pcm)
+        finally:
+            if not exhausted:
+                # Stopped early by the consumer, ffmpeg would block on a full pipe
+                process.kill()
+            await process.wait()
+
+        if process.returncode:
+            stderr.seek(0)
+            error = (stderr.read().decode(errors='replace').strip()
+                     or f"ffmpeg exited with status {process.returncode}")
+            logger.error(f"Failed to segment audio file {audio_file}: {error}")
+            if errors is not None:
+                errors.append(error)
+    logger.debug(f"Streamed {count} segments of {SEGMENT_LENGTH}ms each")
+
+
+def probe_segment_count(audio_file: str) -> Optional[int]:
+    """
+    Returns how many segments audio_file will be split into, based on the
+    duration ffprobe reports, or None if it cannot be determined.
+    """
+    command = [
+        "ffprobe", "-v", "error", "-show_entries", "format=duration",
+        "-of", "default=noprint_wrappers=1:nokey=1", audio_file,
+    ]
+    try:
+        result = subprocess.run(command, check=True, capture_output=True, text=True)
+        return math.ceil(float(result.stdout.strip()) * 1000 / SEGMENT_LENGTH)
+    except (OSError, subprocess.CalledProcessError, ValueError) as e:
+        logger.debug(f"Could not probe duration of {audio_file}: {e}")
+        return None
+
+
+def advise_sequential_read(file_path: str) -> None:
+    """
+    Hints the kernel that file_path will be read sequentially and soon, so it
+    starts reading it ahead into the page cache. No-op where posix_fadvise
+    is unavailable (macOS, Windows).
+    """
+    if not hasattr(os, "posix_fadvise"):
+        return
+    try:
+        fd = os.open(file_path, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        finally:
+            os.close(fd)
+    except OSError as e:
+        logger.debug(f"Could not advise read-ahead for {file_path}: {e}")
+
+
+def prepare_segments(audio_file: str) -> tuple[list[bytes], list[str]]:
+    """
+    Starts read-ahead of audio_file and segments it.
+    Returns the segments in playback order and any decode errors.
+    """
+    advise_sequential_read(audio_file)
+    errors: list[str] = []
+    return segment_audio(audio_file, errors), errors
+
+
+class AsyncRateLimiter:
+    """
+    Token bucket shared by concurrent recognitions: lets `burst` requests
+    through at once, then refills at `rate` tokens per second.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.last = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class SessionHTTPClient(HTTPClientInterface):
+    """
+    shazamio HTTP client sending every request through one shared aiohttp
+    session, so connections and TLS sessions are kept alive across segments.
+    Retries are left to get_name instead of shazamio's built-in retry client.
+    """
+
+    def __init__(self, limit_per_host: int = RECOGNITION_CONCURRENCY):
+        self.session = aiohttp.ClientSession(
+            # Shazam's host is resolved once for the whole run instead of every 10 s
+            connector=aiohttp.TCPConnector(limit_per_host=limit_per_host, ttl_dns_cache=DNS_CACHE_TTL,
+                                           keepalive_timeout=KEEPALIVE_TIMEOUT)
+        )
+
+    async def request(self, method: str, url: str, *args, **kwargs):
+        if method.upper() not in ("GET", "POST"):
+            raise BadMethod("Accept only GET/POST")
+        async with self.session.request(method.upper(), url, **kwargs) as resp:
+            if resp.status == 429:
+                resp.raise_for_status()
+            return await validate_json(resp, *args)
+
+    async def close(self) -> None:
+        await self.session.close()
+
+
+class RecognitionCache:
+    """
+    SQLite store of recognized tracks keyed by the SHA-256 of the segment
+    audio, so segments already identified in an earlier run skip Shazam.
+    Entries older than `ttl` seconds are evicted when the cache is opened.
+    Lookups and writes are both issued from worker threads, never the event
+    loop, so every use of the connection is serialized by a lock.
+    """
+
+    def __init__(self, path: Optional[str] = None, ttl: int = CACHE_TTL):
+        # Resolved per instance so a --cache-dir given at runtime is honoured
+        path = path or os.path.join(CACHE_DIR, CACHE_DB_NAME)
+        ensure_directory_exists(os.path.dirname(path))
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS cache (hash TEXT PRIMARY KEY, result TEXT NOT NULL, ts INTEGER NOT NULL)"
+        )
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS files (key TEXT PRIMARY KEY, tracks TEXT NOT NULL, ts INTEGER NOT NULL)"
+        )
+        expired = int(time.time()) - ttl
+        self.connection.execute("DELETE FROM cache WHERE ts < ?", (expired,))
+        self.connection.execute("DELETE FROM files WHERE ts < ?", (expired,))
+        self.connection.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        with self.lock:
+            row = self.connection.execute("SELECT result FROM cache WHERE hash = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def put_many(self, entries: list[tuple[str, str]], files: list[tuple[str, list[str]]] = ()) -> None:
+        """
+        Stores segment results and whole-file track lists in one transaction.
+        """
+        now = int(time.time())
+        with self.lock:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO cache (hash, result, ts) VALUES (?, ?, ?)",
+                [(key, result, now) for key, result in entries],
+            )
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO files (key, tracks, ts) VALUES (?, ?, ?)",
+                [(key, "\n".join(tracks), now) for key, tracks in files],
+            )
+            self.connection.commit()
+
+    def get_file(self, key: str) -> Optional[list[str]]:
+        with self.lock:
+            row = self.connection.execute("SELECT tracks FROM files WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        return row[0].split("\n") if row[0] else []
+
+    def close(self) -> None:
+        with self.lock:
+            self.connection.close()
+
+
+def file_cache_key(audio_file: str) -> str:
+    """
+    Returns a key identifying audio_file's content and the settings it was
+    recognized with, reading at most 2 * FILE_HASH_SPAN bytes of it.
+    """
+    digest = hashlib.sha256()
+    size = os.path.getsize(audio_file)
+    digest.update(f"{size}:{SEGMENT_LENGTH}:{FILE_CACHE_VERSION}:".encode())
+    with open(audio_file, "rb") as f:
+        digest.update(f.read(FILE_HASH_SPAN))
+        if size > FILE_HASH_SPAN:
+            f.seek(max(FILE_HASH_SPAN, size - FILE_HASH_SPAN))
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def lookup_file_result(audio_file: str, cache: RecognitionCache) -> tuple[str, Optional[list[str]]]:
+    """
+    Returns audio_file's cache key and its stored tracks, or None for the
+    tracks if the file has not been fully recognized before.
+    """
+    key = file_cache_key(audio_file)
+    return key, cache.get_file(key)
+
 
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 8.0) -> float:
+    """
+    Exponential backoff with a little jitter so retries don't fire in lockstep.
+    """
+    return min(cap, base * 2 ** attempt) + random.uniform(0, 0.25)
 
-async def get_name(file_path: str, max_retries: int = 3) -> str:
+
+def retry_after_delay(error: Exception) -> Optional[float]:
+    """
+    Returns the wait a 429 response asked for in its Retry-After header,
+    given as seconds or an HTTP date, or None if there is no usable value.
+    """
+    headers = getattr(error, "headers", None)
+    value = headers.get("Retry-After") if headers else None
+    if not value:
+        return None
+    try:
+        delay = float(value)
+    except ValueError:
+        try:
+            delay = (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds()
+        except (TypeError, ValueError):
+            return None
+    return delay if 0 <= delay <= MAX_RETRY_AFTER else None
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """
+    Shazam answers throttled requests with HTTP 429, usually with an HTML body
+    that shazamio fails to decode as JSON.
+    """
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status == 429
+    return isinstance(error, FailedDecodeJson)
+
+
+def is_transient_error(error: Exception) -> bool:
+    """
+    Network failures worth retrying; anything else (unreadable audio, bad
+    input) fails the same way on every attempt.
+    """
+    return isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError))
+
+
+async def get_name(shazam: Shazam, audio: bytes, limiter: Optional[AsyncRateLimiter] = None,
+                   max_retries: int = 3) -> str:
     """
     Uses Shazam to recognize the song with retry logic and error handling.
-    Returns either 'Artist - Track Title' or 'Not found' if it fails.
+    Returns 'Artist - Track Title', NOT_FOUND if there is no match,
+    RATE_LIMITED if the last attempt was throttled, or REQUEST_FAILED if the
+    request kept failing or failed with an error not worth retrying.
     """
-    shazam = Shazam()
-    logger.debug(f"Attempting to recognize: {file_path} (max retries: {max_retries})")
+    logger.debug(f"Attempting to recognize {len(audio)} bytes of audio (max retries: {max_retries})")
+    result = REQUEST_FAILED
     for attempt in range(max_retries):
+        delay = None
         try:
             logger.debug(f"Recognition attempt {attempt+1}/{max_retries}")
-            data = await shazam.recognize(file_path)
-            if 'track' not in data:
-                logger.debug(f"No track data found in attempt {attempt+1}")
-                if attempt < max_retries - 1:
-                    await asyncio.sleep(1)
-                    continue
-                logger.debug("Recognition failed after all attempts")
-                return "Not found"
-
-            title = data['track']['title']
-            subtitle = data['track']['subtitle']
-            result = f"{subtitle} - {title}"
-            logger.debug(f"Recognition successful: {result}")
-            return result
+            if limiter is not None:
+                await limiter.acquire()
+            data = await shazam.recognize(audio)
+            if 'track' in data:
+                title = data['track']['title']
+                subtitle = data['track']['subtitle']
+                result = f"{subtitle} - {title}"
+                logger.debug(f"Recognition successful: {result}")
+                return result
+            # A decoded answer without a match won't change on retry
+            logger.debug(f"No track data found in attempt {attempt+1}")
+            return NOT_FOUND
 
         except Exception as e:
-            logger.debug(f"Error in recognition attempt {attempt+1}: {str(e)}")
-            if attempt < max_retries - 1:
-                await asyncio.sleep(1)
+            if is_rate_limit_error(e):
+                logger.debug(f"Rate limited in recognition attempt {attempt+1}: {str(e)}")
+                result = RATE_LIMITED
+                delay = retry_after_delay(e)
+            elif is_transient_error(e):
+                logger.debug(f"Error in recognition attempt {attempt+1}: {str(e)}")
+                result = REQUEST_FAILED
+                # Network hiccups clear quickly, so they retry sooner than throttling
+                delay = backoff_delay(attempt, base=0.5)
+            else:
+                logger.debug(f"Recognition failed with a non-retryable error: {str(e)}")
+                return REQUEST_FAILED
+
+        if attempt < max_retries - 1:
+            await asyncio.sleep(delay if delay is not None else backoff_delay(attempt))
+
+    logger.debug(f"Recognition failed after all attempts: {result}")
+    return result
+
+
+async def iterate_segments(segments: Iterable[bytes]) -> AsyncIterator[bytes]:
+    """
+    Adapts already segmented audio to the stream recognize_all consumes.
+    """
+    for segment in segments:
+        yield segment
+
+
+class RecognitionContext:
+    """
+    Shazam client, rate limiter and cache shared by every file recognized in
+    one run, so files processed concurrently count against one rate limit and
+    a segment repeated across files is only sent once.
+    """
+
+    def __init__(self, concurrency: int = RECOGNITION_CONCURRENCY, use_cache: bool = True):
+        self.concurrency = concurrency
+        self.http_client = SessionHTTPClient(limit_per_host=concurrency)
+        self.shazam = Shazam(http_client=self.http_client)
+        self.limiter = AsyncRateLimiter(SHAZAM_REQUESTS_PER_MINUTE / 60, SHAZAM_BURST)
+        self.cache = RecognitionCache() if use_cache else None
+        # One shared future per distinct segment hash
+        self.in_flight: dict[str, asyncio.Future] = {}
+        # New matches and fully recognized files, written to the cache in one
+        # transaction by flush()
+        self.new_entries: list[tuple[str, str]] = []
+        self.new_files: list[tuple[str, list[str]]] = []
+        self.flush_lock = asyncio.Lock()
+
+    async def recognize(self, key: str, segment: bytes) -> str:
+        # A lookup may wait on a flush's commit, so it stays off the event loop too
+        cached = await asyncio.to_thread(self.cache.get, key) if self.cache is not None else None
+        if cached is not None:
+            logger.debug(f"Cache hit for segment {key[:12]}: {cached}")
+            return cached
+        track_name = await get_name(self.shazam, segment, self.limiter)
+        # Only actual matches are cached, so anything else is asked again on a later run
+        if self.cache is not None and track_name not in UNRECOGNIZED:
+            self.new_entries.append((key, track_name))
+        return track_name
+
+    def store_file(self, key: str, tracks: list[str]) -> None:
+        if self.cache is not None:
+            self.new_files.append((key, tracks))
+
+    async def flush(self) -> None:
+        if self.cache is None or not (self.new_entries or self.new_files):
+            return
+        # The commit syncs to disk, so it runs off the event loop thread, one flush at a time
+        async with self.flush_lock:
+            entries, self.new_entries = self.new_entries, []
+            files, self.new_files = self.new_files, []
+            await asyncio.to_thread(self.cache.put_many, entries, files)
+
+    async def close(self) -> None:
+        await self.http_client.close()
+        await self.flush()
+        if self.cache is not None:
+            self.cache.close()
+
+
+async def recognize_all(segments: Union[Iterable[bytes], AsyncIterable[bytes]],
+                        total_segments: Optional[int] = None,
+                        context: Optional[RecognitionContext] = None,
+                        use_cache: bool = True, label: str = "") -> list:
+    """
+    Recognizes segments as they arrive through one shared Shazam client, with
+    `concurrency` workers pulling from a bounded queue, so a streaming source
+    is only read ahead of Shazam by a few segments. Identical segments are
+    sent once, silent segments are not sent at all, a segment sounding like
+    the last one sent reuses its result, and with use_cache, tracks found in
+    earlier runs are reused.
+    Without a context, one is created for this call and closed at the end.
+    Results are returned in segment order; a segment that raised yields its
+    exception instead.
+    """
+    if not isinstance(segments, AsyncIterable):
+        if total_segments is None:
+            segments = list(segments)
+            total_segments = len(segments)
+        segments = iterate_segments(segments)
+    # Only used for progress output; streamed files may not know it upfront
+    total = total_segments or "?"
+
+    owns_context = context is None
+    if owns_context:
+        context = RecognitionContext(use_cache=use_cache)
+    in_flight = context.in_flight
+    pending: asyncio.Queue = asyncio.Queue(maxsize=context.concurrency)
+    results: dict[int, object] = {}
+    # Segments reusing another segment's result, and those still waiting for it
+    aliases: dict[int, int] = {}
+    followers: dict[int, list[int]] = {}
+
+    def report_reused(idx: int) -> None:
+        source = aliases[idx]
+        logger.info(f"{label}[{idx}/{total}]: {results[source]} (reused from segment {source})")
+
+    async def recognize_one(idx: int, segment: bytes) -> str:
+        key = hashlib.sha256(segment).hexdigest()
+        if key not in in_flight:
+            logger.debug(f"{label}Recognizing segment {idx}/{total}")
+            in_flight[key] = asyncio.ensure_future(context.recognize(key, segment))
+        track_name = await in_flight[key]
+        # Progress is reported as segments complete, which may be out of order
+        logger.info(f"{label}[{idx}/{total}]: {track_name}")
+        return track_name
+
+    async def worker() -> None:
+        # A None item tells the worker the source is exhausted
+        while (item := await pending.get()) is not None:
+            idx, segment = item
+            try:
+                results[idx] = await recognize_one(idx, segment)
+            except Exception as e:
+                results[idx] = e
+            for follower in followers.pop(idx, ()):
+                report_reused(follower)
+
+    workers = [asyncio.create_task(worker()) for _ in range(context.concurrency)]
+    count = 0
+    # Last segment sent for recognition and its signature. Comparing against it
+    # rather than the previous segment keeps a slowly changing mix from drifting.
+    anchor: Optional[tuple[int, list]] = None
+    try:
+        async for segment in segments:
+            count += 1
+            signature = segment_signature(segment)
+            if is_silent(signature):
+                logger.debug(f"{label}Segment {count} is silent, skipping recognition")
+                results[count] = NOT_FOUND
+                logger.info(f"{label}[{count}/{total}]: {NOT_FOUND}")
+                continue
+            if anchor is not None and signature_distance(anchor[1], signature) < SIMILARITY_THRESHOLD:
+                logger.debug(f"{label}Segment {count} sounds like segment {anchor[0]}, reusing its result")
+                aliases[count] = anchor[0]
+                if anchor[0] in results:
+                    report_reused(count)
+                else:
+                    followers.setdefault(anchor[0], []).append(count)
                 continue
-            logger.debug("Recognition failed after all attempts due to exception")
-            return "Not found"
+            anchor = (count, signature)
+            await pending.put((count, segment))
+    finally:
+        for _ in workers:
+            await pending.put(None)
+        await asyncio.gather(*workers)
+        if owns_context:
+            await context.close()
+        else:
+            await context.flush()
+    return [results[aliases.get(idx, idx)] for idx in range(1, count + 1)]
+
+
+def format_section(audio_file: str, tracks) -> str:
+    """
+    Returns the results section for one file: header, tracks and the empty
+    line closing it.
+    """
+    header = f"===== {os.path.basename(audio_file)} ======\n"
+    return header + "".join(f"{track}\n" for track in tracks) + "\n"
 
 
-def process_audio_file(audio_file: str, output_filename: str, file_index: int, total_files: int) -> None:
+async def process_audio_file_async(audio_file: str, file_index: int, total_files: Optional[int],
+                                   prefetched: Optional[Future] = None, use_cache: bool = True,
+                                   file_key: Optional[str] = None,
+                                   context: Optional[RecognitionContext] = None) -> str:
     """
     Processes a single audio file: segments it, recognizes each segment,
-    excludes duplicate tracks, and saves results.
+    excludes duplicate tracks, and returns the file's results section.
+    If prefetched is given, it is a pending prepare_segments call for this
+    file, and segmentation is not repeated here.
+    With use_cache, a file recognized in full before is answered from the
+    cache; callers that already looked it up pass its file_key.
+    Files processed concurrently share one RecognitionContext; without one,
+    a context is created for this file and closed at the end.
+    total_files is None while the number of files is not known yet.
     """
+    if context is None:
+        context = RecognitionContext(use_cache=use_cache)
+        try:
+            return await process_audio_file_async(audio_file, file_index, total_files, prefetched=prefetched,
+                                                  use_cache=use_cache, file_key=file_key, context=context)
+        finally:
+            await context.close()
+
     # If there are multiple files, display the file index
-    if total_files > 2:
+    if total_files is None:
+        logger.info(f"\n[{file_index}] Processing file: {audio_file}")
+    elif total_files > 2:
         logger.info(f"\n[{file_index}/{total_files}] Processing file: {audio_file}")
     else:
         logger.info(f"\nProcessing file: {audio_file}")
     
     logger.debug(f"Starting processing for {audio_file}")
-    unique_tracks = set()
-    try:
-        with open(output_filename, "a", encoding="utf-8") as f:
-            f.write(f"===== {os.path.basename(audio_file)} ======\n")
-        logger.debug(f"Created file header for {audio_file}")
-    except OSError as e:
-        logger.error(f"Error writing header for {audio_file}: {e}")
-        return
 
-    logger.info("1/5 🧹 Cleaning temporary files...")
-    remove_files("tmp")
+    if context.cache is not None and file_key is None:
+        file_key, cached_tracks = await asyncio.to_thread(lookup_file_result, audio_file, context.cache)
+        if cached_tracks is not None:
+            logger.info(f"♻️ Using cached results for {audio_file}")
+            return format_section(audio_file, cached_tracks)
+
+    if prefetched is None:
+        # Segments are decoded while earlier ones are already being recognized
+        logger.info("1/3 ✂️ Segmenting audio file...")
+        decode_errors: list[str] = []
+        segments = stream_segments(audio_file, decode_errors)
+        total_segments = await asyncio.to_thread(probe_segment_count, audio_file)
+    else:
+        logger.info("1/3 ✂️ Waiting for prefetched segments...")
+        segments, decode_errors = await asyncio.wrap_future(prefetched)
+        total_segments = len(segments)
 
-    logger.info("2/5 ✂️ Segmenting audio file...")
-    segment_audio(audio_file, "tmp")
+    logger.info("2/3 🔍 Recognizing segments...")
+    logger.debug(f"Expecting {total_segments or 'an unknown number of'} segments to process")
 
-    logger.info("3/5 🔍 Recognizing segments...")
-    tmp_files = sorted(os.listdir("tmp"), key=lambda x: int(os.path.splitext(x)[0]))
-    total_segments = len(tmp_files)
-    logger.debug(f"Found {total_segments} segments to process")
+    # Progress lines of concurrently processed files are told apart by name
+    label = f"{os.path.basename(audio_file)} " if total_files != 1 else ""
+    results = await recognize_all(segments, total_segments, context=context,
+                                  use_cache=use_cache, label=label)
 
-    for idx, file_name in enumerate(tmp_files, start=1):
-        segment_path = os.path.join("tmp", file_name)
-        try:
-            loop = asyncio.get_event_loop()
-            track_name = loop.run_until_complete(get_name(segment_path))
+    track_names = []
+    failed = 0
+    for idx, result in enumerate(results, start=1):
+        if isinstance(result, Exception):
+            logger.error(f"Error processing segment {idx}: {result}")
+            failed += 1
+            continue
+        track_names.append(result)
 
-            # Build the progress output in the desired format
-            progress_str = f"[{idx}/{total_segments}]: {track_name}"
-            logger.info(progress_str)
+    # A dict keeps first-seen order while dropping duplicates, hashing each name once
+    unique_tracks = dict.fromkeys(name for name in track_names if name not in UNRECOGNIZED)
 
-            if track_name != "Not found" and track_name not in unique_tracks:
-                unique_tracks.add(track_name)
-                write_to_file(track_name, output_filename)
-                logger.debug(f"Added new unique track: {track_name}")
-        except Exception as e:
-            logger.error(f"Error processing segment {file_name}: {e}")
-            continue
+    rate_limited = track_names.count(RATE_LIMITED)
+    if rate_limited:
+        logger.warning(f"⚠️ {rate_limited} segment(s) could not be recognized due to Shazam rate limiting")
+    request_failed = track_names.count(REQUEST_FAILED)
+    if request_failed:
+        logger.warning(f"⚠️ {request_failed} segment(s) could not be recognized because the request failed")
 
-    # Add an empty line after processing each file
-    try:
-        with open(output_filename, "a", encoding="utf-8") as f:
-            f.write("\n")
-    except OSError as e:
-        logger.error(f"Error writing empty line for {audio_file}: {e}")
+    if decode_errors:
+        logger.warning(f"⚠️ {audio_file} could not be decoded in full, its results may be incomplete")
+
+    # Only complete results are memoized, so a later run retries the gaps
+    if (file_key is not None and results and not failed and not rate_limited and not request_failed
+            and not decode_errors):
+        context.store_file(file_key, list(unique_tracks))
+        await context.flush()
 
-    logger.info("🧹 Cleaning temporary files...")
-    remove_files("tmp")
     logger.info(f"✅ Successfully processed file: {audio_file}")
     logger.debug(f"Found {len(unique_tracks)} unique tracks in {audio_file}")
 
+    return format_section(audio_file, unique_tracks)
+
+
+def process_audio_file(audio_file: str, file_index: int, total_files: int,
+                       prefetched: Optional[Future] = None, use_cache: bool = True,
+                       file_key: Optional[str] = None) -> str:
+    """
+    Runs process_audio_file_async in one event loop for the whole file.
+    """
+    return asyncio.run(process_audio_file_async(audio_file, file_index, total_files, prefetched=prefetched,
+                                                use_cache=use_cache, file_key=file_key))
+
+
+async def iterate_entries(entries: list[tuple[int, str]]) -> AsyncIterator[tuple[int, str]]:
+    """
+    Adapts a list of (index, path) file entries to the stream process_files consumes.
+    """
+    for entry in entries:
+        yield entry
+
+
+async def process_files(files: Union[list[tuple[int, str]], AsyncIterable[tuple[int, str]]],
+                        total_files: Optional[int], use_cache: bool = True,
+                        parallel_files: int = PARALLEL_FILES) -> dict[int, str]:
+    """
+    Processes (index, path) entries concurrently, parallel_files at
+    a time, through one shared RecognitionContext. Up to SEGMENT_WORKERS files
+    are segmented ahead in worker threads, each driving an ffmpeg process.
+    files may also be an async stream, whose entries start as they arrive.
+    Files recognized in full by an earlier run are answered from the cache
+    and never decoded.
+    Returns each file's results section by index; files that failed are left out.
+    """
+    workers = min(SEGMENT_WORKERS, len(files)) if isinstance(files, list) else SEGMENT_WORKERS
+    # Files enter in order: `window` bounds how many are decoded and held in
+    # memory, `active` how many are recognized at once. The window is never
+    # smaller than parallel_files, or it would cap --workers at SEGMENT_WORKERS.
+    window = asyncio.Semaphore(max(workers, parallel_files))
+    active = asyncio.Semaphore(parallel_files)
+    context = RecognitionContext(use_cache=use_cache)
+
+    with ThreadPoolExecutor(max_workers=workers) as prefetcher:
+        async def process(idx: int, full_path: str) -> str:
+            file_key = None
+            # Looked up before prefetching, so a cache hit is never decoded
+            if context.cache is not None:
+                file_key, cached_tracks = await asyncio.to_thread(lookup_file_result, full_path, context.cache)
+                if cached_tracks is not None:
+                    position = f"{idx}/{total_files}" if total_files else f"{idx}"
+                    logger.info(f"♻️ [{position}] Using cached results for {full_path}")
+                    return format_section(full_path, cached_tracks)
+            async with window:
+                prefetched = prefetcher.submit(prepare_segments, full_path)
+                async with active:
+                    logger.debug(f"Processing file {idx}/{total_files}: {full_path}")
+                    return await process_audio_file_async(full_path, idx, total_files, prefetched=prefetched,
+                                                          use_cache=use_cache, file_key=file_key,
+                                                          context=context)
+
+        entries, tasks = [], []
+        try:
+            if isinstance(files, list):
+                files = iterate_entries(files)
+            async for entry in files:
+                entries.append(entry)
+                tasks.append(asyncio.create_task(process(*entry)))
+        finally:
+            # Files already started are finished even if the stream fails
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+            await context.close()
+
+    sections = {}
+    for (idx, full_path), result in zip(entries, results):
+        if isinstance(result, Exception):
+            logger.error(f"❌ Failed to process {full_path}: {result}")
+            continue
+        sections[idx] = result
+    return sections
 
-def process_downloads() -> None:
+
+async def with_downloads(entries: list[tuple[int, str]], known: set[str],
+                         urls: list[str]) -> AsyncIterator[tuple[int, str]]:
+    """
+    Yields entries, then downloads urls and yields an entry for each new file
+    as soon as its download finishes, so files are recognized while the
+    remaining URLs are still downloading. Indexes continue after len(known).
+    """
+    for entry in entries:
+        yield entry
+
+    downloaded: asyncio.Queue = asyncio.Queue()
+    downloads = asyncio.create_task(download_from_urls(urls, downloaded))
+    # None marks the end of the downloads, whether they succeeded or not
+    downloads.add_done_callback(lambda _: downloaded.put_nowait(None))
+    idx = len(known)
+    while (path := await downloaded.get()) is not None:
+        # yt-dlp reports files it already had under their existing name
+        path = os.path.normpath(path)
+        if path in known:
+            continue
+        known.add(path)
+        idx += 1
+        yield idx, path
+    await downloads
+
+
+def process_downloads(use_cache: bool = True, parallel_files: int = PARALLEL_FILES,
+                      urls: Optional[list[str]] = None) -> None:
     """
     Process all MP3 files in DOWNLOADS_DIR: recognize each and save results to a new file.
+    Up to parallel_files files are recognized at the same time.
+    With urls, those are downloaded in the meantime and each new file joins
+    the run as soon as its download finishes.
     """
     output_dir = "recognised-lists"
     ensure_directory_exists(output_dir)
     ensure_directory_exists(DOWNLOADS_DIR)
 
-    mp3_files = [f for f in os.listdir(DOWNLOADS_DIR) if f.endswith('.mp3')]
-    if not mp3_files:
+    # scandir yields entries with their full path already joined
+    with os.scandir(DOWNLOADS_DIR) as it:
+        full_paths = [e.path for e in it if e.name.endswith('.mp3') and e.is_file()]
+    if not full_paths and not urls:
         logger.warning(f"❌ No MP3 files found in '{DOWNLOADS_DIR}' directory.")
         return
 
     timestamp = datetime.now().strftime("%d%m%y-%H%M%S")
     output_filename = os.path.join(output_dir, f"songs-{timestamp}.txt")
-    logger.debug(f"Created output file: {output_filename}")
-
-    try:
-        with open(output_filename, "w", encoding="utf-8") as f:
-            f.write(f"===== Scan results for {DOWNLOADS_DIR} directory ======\n\n")
-    except OSError as e:
-        logger.error(f"Error creating output file {output_filename}: {e}")
-        return
+    # All sections are collected and written to output_filename in one go at the end
+    chunks = [f"===== Scan results for {DOWNLOADS_DIR} directory ======\n\n"]
 
-    total_files = len(mp3_files)
+    total_files = len(full_paths)
     logger.info(f"📝 Found {total_files} MP3 file(s) to process...")
+    if urls:
+        logger.info(f"⬇️ Downloading {len(urls)} URL(s) while processing...")
     logger.info("🚀 Starting processing...")
 
-    for idx, file_name in enumerate(mp3_files, start=1):
-        full_path = os.path.join(DOWNLOADS_DIR, file_name)
-        logger.debug(f"Processing file {idx}/{total_files}: {full_path}")
-        process_audio_file(full_path, output_filename, idx, total_files)
+    entries = list(enumerate(full_paths, start=1))
+    if urls:
+        known = {os.path.normpath(path) for path in full_paths}
+        sections = asyncio.run(process_files(with_downloads(entries, known, urls), None,
+                                             use_cache, parallel_files))
+        total_files = len(known)
+        if not total_files:
+            logger.warning(f"❌ No MP3 files found in '{DOWNLOADS_DIR}' directory after download.")
+            return
+    else:
+        sections = asyncio.run(process_files(entries, total_files, use_cache, parallel_files))
 
-    logger.info(f"\n5/5 ✨ All files successfully processed!")
+    chunks.extend(sections[idx] for idx in range(1, total_files + 1) if idx in sections)
+    write_chunks(chunks, output_filename)
+    logger.debug(f"Created output file: {output_filename}")
+
+    logger.info(f"\n3/3 ✨ All files successfully processed!")
     logger.info(f"📋 Results saved to {output_filename}")
 
 
@@ -334,30 +1171,53 @@ Usage: python shazam.py [command] [options]
 
 Commands:
     🔍 scan                       Scan downloads directory and recognize all MP3
-    ⬇️  download <url>            Download and process audio from YouTube or SoundCloud
+    ⬇️  download <url> [<url>...] Download and process audio from YouTube or SoundCloud
     🎯 recognize <file_or_url>    Recognize specific audio file or download and recognize from URL
 
 Options:
     --debug                       Enable debug mode with detailed logging
+    --no-cache                    Ignore cached recognitions and query Shazam for every segment
+    --cache-dir <dir>             Keep the recognition cache in <dir> instead of ./cache
+    --workers <n>                 Recognize up to <n> files at the same time when scanning (default: 2)
 
 Examples:
     python shazam.py scan
     python shazam.py scan --debug
     python shazam.py download https://www.youtube.com/watch?v=...
     python shazam.py download https://soundcloud.com/... --debug
+    python shazam.py download https://youtu.be/... https://soundcloud.com/...
     python shazam.py recognize path/to/audio.mp3
     python shazam.py recognize https://soundcloud.com/... 
     """)
 
 
+def positive_int(value: str) -> int:
+    """
+    argparse type for options that need a count of at least 1.
+    """
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid int value: '{value}'")
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(description='Shazam Tool', add_help=False)
     parser.add_argument('command', nargs='?', help='scan, download, or recognize')
     parser.add_argument('--debug', action='store_true', help='Enable debug mode with detailed logging')
-    parser.add_argument('url_or_file', nargs='?', help='URL or file path, depending on command')
+    parser.add_argument('--no-cache', action='store_true', help='Ignore cached recognitions')
+    parser.add_argument('--cache-dir', help='Directory holding the recognition cache')
+    parser.add_argument('--workers', type=positive_int, default=PARALLEL_FILES,
+                        help='Number of files recognized at the same time when scanning')
+    # Every word after the command is kept, so unquoted paths with spaces and
+    # several URLs come through; options may still appear anywhere
+    parser.add_argument('url_or_file', nargs='*', help='URL or file path, depending on command')
     
     # Parse known args to avoid error with unrecognized args
-    args, unknown = parser.parse_known_args()
+    args, unknown = parser.parse_known_intermixed_args()
     
     if not args.command:
         print_usage()
@@ -365,6 +1225,10 @@ def main() -> None:
     
     # Set up logging based on debug flag
     setup_logging(args.debug)
+
+    if args.cache_dir:
+        global CACHE_DIR
+        CACHE_DIR = args.cache_dir
     
     command = args.command
     output_dir = "recognised-lists"
@@ -374,44 +1238,22 @@ def main() -> None:
     timestamp = datetime.now().strftime("%d%m%y-%H%M%S")
     output_filename = os.path.join(output_dir, f"songs-{timestamp}.txt")
 
-    # Special handling for download and recognize commands to support unquoted URLs
-    if command == 'download' or command == 'recognize':
-        # Determine the URL/file by reconstructing from sys.argv
-        # Skip 'python', 'shazam.py', 'command', and potentially '--debug'
-        start_idx = 2  # Skip program name and command
-        if '--debug' in sys.argv:
-            # If --debug is immediately after command, adjust accordingly
-            if sys.argv.index('--debug') == start_idx:
-                start_idx += 1
-        
-        # If we still have arguments left, reconstruct them
-        if len(sys.argv) > start_idx:
-            # Join all remaining arguments to handle spaces in URLs or file paths
-            url_or_file = ' '.join(sys.argv[start_idx:])
-        else:
-            url_or_file = None
-    else:
-        # For other commands, use argparse result
-        url_or_file = args.url_or_file
+    # Join all remaining arguments to handle spaces in URLs or file paths
+    url_or_file = ' '.join(args.url_or_file) or None
 
     if command == 'download':
         if not url_or_file:
-            logger.error("Missing URL. Usage: python shazam.py download <url> [--debug]")
+            logger.error("Missing URL. Usage: python shazam.py download <url> [<url>...] [--debug]")
             sys.exit(1)
 
-        try:
-            with open(output_filename, "w", encoding="utf-8") as f:
-                f.write("===== Download Results ======\n\n")
-        except OSError as e:
-            logger.error(f"Error creating output file {output_filename}: {e}")
-            sys.exit(1)
-
-        download_from_url(url_or_file)
-        process_downloads()
+        # Several URLs may be passed separated by spaces or newlines;
+        # files are recognized while the rest are still downloading
+        urls = url_or_file.split()
+        process_downloads(use_cache=not args.no_cache, parallel_files=args.workers, urls=urls)
 
     elif command in ['scan', 'scan-downloads']:
         logger.info(f"Scanning '{DOWNLOADS_DIR}' directory for MP3 files...")
-        process_downloads()
+        process_downloads(use_cache=not args.no_cache, parallel_files=args.workers)
         return
     
     elif command == 'recognize':
@@ -424,26 +1266,16 @@ def main() -> None:
         # Check if the input is a URL
         if audio_file.startswith('http://') or audio_file.startswith('https://'):
             logger.info(f"URL detected: {audio_file}")
-            # Download from URL first
-            download_from_url(audio_file)
-            # Find the downloaded file in the downloads directory
-            mp3_files = [f for f in os.listdir(DOWNLOADS_DIR) if f.endswith('.mp3')]
-            if not mp3_files:
-                logger.error(f"No MP3 files found in '{DOWNLOADS_DIR}' directory after download.")
+            # Download from URL first; yt-dlp reports the file it wrote
+            # (or already had), so only that one is processed
+            downloaded = download_from_url(audio_file)
+            if not downloaded:
+                logger.error(f"No MP3 file was downloaded from {audio_file}.")
                 sys.exit(1)
-            # Process only the most recently downloaded file 
-            # (assuming it's the one we just downloaded)
-            latest_file = max([os.path.join(DOWNLOADS_DIR, f) for f in mp3_files], 
-                              key=os.path.getmtime)
-            
-            try:
-                with open(output_filename, "w", encoding="utf-8") as f:
-                    f.write("===== Recognition Results ======\n\n")
-            except OSError as e:
-                logger.error(f"Error creating output file {output_filename}: {e}")
-                sys.exit(1)
-                
-            process_audio_file(latest_file, output_filename, 1, 1)
+            latest_file = downloaded[0]
+
+            section = process_audio_file(latest_file, 1, 1, use_cache=not args.no_cache)
+            write_chunks(["===== Recognition Results ======\n\n", section], output_filename)
             logger.info(f"\nResults saved to {output_filename}")
             return
         
@@ -452,15 +1284,9 @@ def main() -> None:
             logger.error(f"Error: File '{audio_file}' not found.")
             sys.exit(1)
 
-        try:
-            with open(output_filename, "w", encoding="utf-8") as f:
-                f.write("===== Recognition Results ======\n\n")
-        except OSError as e:
-            logger.error(f"Error creating output file {output_filename}: {e}")
-            sys.exit(1)
-
         # Since we're processing a single file, pass file_index=1 and total_files=1
-        process_audio_file(audio_file, output_filename, 1, 1)
+        section = process_audio_file(audio_file, 1, 1, use_cache=not args.no_cache)
+        write_chunks(["===== Recognition Results ======\n\n", section], output_filename)
         logger.info(f"\nResults saved to {output_filename}")
         return
 